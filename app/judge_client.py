@@ -1,31 +1,40 @@
 from __future__ import annotations
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from math import isnan
+import msgspec
+import numpy as np
+import atexit
 import os
 
-class Client(BaseModel):
+# msgspec.Struct rather than pydantic.BaseModel for the internal judge types:
+# C-implemented construction and msgspec.to_builtins for near-free dumping,
+# plus a slotted memory layout. The FastAPI request/response models in
+# app.main stay Pydantic for boundary validation.
+
+class Client(msgspec.Struct):
     clientId: str
     segment: str
     riskProfile: str
     preferences: Dict[str, Any] = {}
 
-class Holding(BaseModel):
+class Holding(msgspec.Struct):
     accountId: str
     ticker: str
     qty: int
 
-class IndexConstituent(BaseModel):
+class IndexConstituent(msgspec.Struct):
     ticker: str
     weight: float
     sector: str
 
-class PriceBar(BaseModel):
+class PriceBar(msgspec.Struct):
     date: str
     ticker: str
     close: float
     adv: Optional[float] = None
 
-class SentimentRecord(BaseModel):
+class SentimentRecord(msgspec.Struct):
     date: str
     ticker: str
     label: str  # pos/neg/neu
@@ -39,14 +48,6 @@ STUB_CLIENTS: List[Client] = [
     Client(clientId="C003", segment="hni", riskProfile="growth"),
     Client(clientId="C004", segment="retail", riskProfile="balanced"),
 ]
-STUB_HOLDINGS: List[Holding] = [
-    Holding(accountId="C001", ticker="AAPL", qty=120),
-    Holding(accountId="C001", ticker="MSFT", qty=80),
-    Holding(accountId="C002", ticker="V", qty=50),
-    Holding(accountId="C003", ticker="NVDA", qty=30),
-    Holding(accountId="C004", ticker="TSLA", qty=20),
-    Holding(accountId="C004", ticker="AAPL", qty=15),
-]
 STUB_INDEX: List[IndexConstituent] = [
     IndexConstituent(ticker="AAPL", weight=0.035, sector="Information Technology"),
     IndexConstituent(ticker="MSFT", weight=0.040, sector="Information Technology"),
@@ -55,19 +56,148 @@ STUB_INDEX: List[IndexConstituent] = [
     IndexConstituent(ticker="TSLA", weight=0.020, sector="Consumer Discretionary"),
     IndexConstituent(ticker="V", weight=0.018, sector="Financials"),
 ]
-STUB_PRICES: List[PriceBar] = [
-    PriceBar(date="2025-08-25", ticker="AAPL", close=227.13, adv=82000000),
-    PriceBar(date="2025-08-25", ticker="MSFT", close=430.55, adv=25000000),
-    PriceBar(date="2025-08-25", ticker="NVDA", close=116.22, adv=60000000),
-    PriceBar(date="2025-08-25", ticker="AMZN", close=171.40, adv=50000000),
-    PriceBar(date="2025-08-25", ticker="TSLA", close=238.65, adv=150000000),
-    PriceBar(date="2025-08-25", ticker="V", close=278.90, adv=7000000),
-]
-STUB_SENTIMENT: List[SentimentRecord] = [
-    SentimentRecord(date="2025-08-25", ticker="AAPL", label="pos", score=0.78, source="https://news.example/a"),
-    SentimentRecord(date="2025-08-25", ticker="TSLA", label="neg", score=0.66, source="https://news.example/b"),
-    SentimentRecord(date="2025-08-25", ticker="MSFT", label="neu", score=0.52, source="https://news.example/c"),
-]
+
+# ---- columnar stub tables (struct-of-arrays) ----
+# Holdings, prices and sentiment are stored as parallel NumPy columns instead
+# of lists of model objects: filters are vectorized compares over one column
+# and dict rows are only materialized once per ingest (see _dumped below).
+# The structs above document the per-row shapes these columns were split from.
+
+def _col(values, dtype=object) -> np.ndarray:
+    return np.asarray(list(values), dtype=dtype)
+
+@dataclass
+class HoldingsTable:
+    account_ids: np.ndarray
+    tickers: np.ndarray
+    qtys: np.ndarray
+
+    def reset(self, account_ids, tickers, qtys) -> None:
+        self.account_ids = _col(account_ids)
+        self.tickers = _col(tickers)
+        self.qtys = _col(qtys, np.int64)
+        invalidate_dump_cache("holdings")
+
+    def to_rows(self) -> List[dict]:
+        return [{"accountId": a, "ticker": t, "qty": q}
+                for a, t, q in zip(self.account_ids, self.tickers, self.qtys.tolist())]
+
+@dataclass
+class PricesTable:
+    dates: np.ndarray
+    tickers: np.ndarray
+    close: np.ndarray
+    adv: np.ndarray
+
+    def reset(self, dates, tickers, close, adv) -> None:
+        self.dates = _col(dates)
+        self.tickers = _col(tickers)
+        self.close = _col(close, np.float64)
+        self.adv = _col(adv, np.float64)
+        invalidate_dump_cache("prices")
+
+    def to_rows(self) -> List[dict]:
+        return [{"date": d, "ticker": t, "close": c, "adv": None if isnan(a) else a}
+                for d, t, c, a in zip(self.dates, self.tickers,
+                                      self.close.tolist(), self.adv.tolist())]
+
+@dataclass
+class SentimentTable:
+    dates: np.ndarray
+    tickers: np.ndarray
+    labels: np.ndarray
+    scores: np.ndarray
+    sources: np.ndarray
+
+    def reset(self, dates, tickers, labels, scores, sources) -> None:
+        self.dates = _col(dates)
+        self.tickers = _col(tickers)
+        self.labels = _col(labels)
+        self.scores = _col(scores, np.float64)
+        self.sources = _col(sources)
+        invalidate_dump_cache("sentiment")
+
+    def to_rows(self) -> List[dict]:
+        return [{"date": d, "ticker": t, "label": l, "score": s, "source": src}
+                for d, t, l, s, src in zip(self.dates, self.tickers, self.labels,
+                                           self.scores.tolist(), self.sources)]
+
+HOLDINGS = HoldingsTable(
+    account_ids=_col(["C001", "C001", "C002", "C003", "C004", "C004"]),
+    tickers=_col(["AAPL", "MSFT", "V", "NVDA", "TSLA", "AAPL"]),
+    qtys=_col([120, 80, 50, 30, 20, 15], np.int64),
+)
+PRICES = PricesTable(
+    dates=_col(["2025-08-25"] * 6),
+    tickers=_col(["AAPL", "MSFT", "NVDA", "AMZN", "TSLA", "V"]),
+    close=_col([227.13, 430.55, 116.22, 171.40, 238.65, 278.90], np.float64),
+    adv=_col([82000000, 25000000, 60000000, 50000000, 150000000, 7000000], np.float64),
+)
+SENTIMENT = SentimentTable(
+    dates=_col(["2025-08-25"] * 3),
+    tickers=_col(["AAPL", "TSLA", "MSFT"]),
+    labels=_col(["pos", "neg", "neu"]),
+    scores=_col([0.78, 0.66, 0.52], np.float64),
+    sources=_col(["https://news.example/a", "https://news.example/b", "https://news.example/c"]),
+)
+
+# ---- cached dict rows for the stub data ----
+# Serializing per model per request dominates the stub GET paths; build the
+# dict rows once per ingest and serve the cached lists until invalidated.
+_DUMP_CACHE: Dict[str, List[dict]] = {}
+
+_DUMP_SOURCES = {
+    "clients": lambda: [msgspec.to_builtins(c) for c in STUB_CLIENTS],
+    "index": lambda: [msgspec.to_builtins(c) for c in STUB_INDEX],
+    "holdings": lambda: HOLDINGS.to_rows(),
+    "prices": lambda: PRICES.to_rows(),
+    "sentiment": lambda: SENTIMENT.to_rows(),
+}
+
+def _dumped(name: str) -> List[dict]:
+    rows = _DUMP_CACHE.get(name)
+    if rows is None:
+        rows = _DUMP_CACHE[name] = _DUMP_SOURCES[name]()
+    return rows
+
+def invalidate_dump_cache(*names: str) -> None:
+    """Drop cached rows for the given keys (all keys if none given)."""
+    if not names:
+        _DUMP_CACHE.clear()
+        _rebuild_price_indices()
+        return
+    for name in names:
+        _DUMP_CACHE.pop(name, None)
+    if "prices" in names or "sentiment" in names:
+        _rebuild_price_indices()
+
+# ---- hash indices over the stub price/sentiment rows ----
+# get_prices/get_sentiment/find_price otherwise linear-scan the rows with
+# Python-level string compares on every rebalance. Build the lookups once per
+# ingest so the hot path is a dict get.
+PRICES_BY_TICKER_DATE: Dict[tuple, dict] = {}
+PRICES_BY_TICKER: Dict[str, List[dict]] = {}
+PRICES_BY_DATE: Dict[str, List[dict]] = {}
+SENTI_BY_TICKER: Dict[str, List[dict]] = {}
+# ticker -> (score - 0.5) * 2, the tilt /rebalance applies; precomputed here
+# so the stub path needs no sentiment scan at request time.
+SENTIMENT_TILT_BY_TICKER: Dict[str, float] = {}
+
+def _rebuild_price_indices() -> None:
+    PRICES_BY_TICKER_DATE.clear()
+    PRICES_BY_TICKER.clear()
+    PRICES_BY_DATE.clear()
+    for p in _dumped("prices"):
+        PRICES_BY_TICKER_DATE[(p["ticker"], p["date"])] = p
+        PRICES_BY_TICKER.setdefault(p["ticker"], []).append(p)
+        PRICES_BY_DATE.setdefault(p["date"], []).append(p)
+    SENTI_BY_TICKER.clear()
+    SENTIMENT_TILT_BY_TICKER.clear()
+    for s in _dumped("sentiment"):
+        SENTI_BY_TICKER.setdefault(s["ticker"], []).append(s)
+        SENTIMENT_TILT_BY_TICKER[s["ticker"]] = (s["score"] - 0.5) * 2.0
+
+_rebuild_price_indices()
 
 class RoboJudgeClient:
     """Internal client. Stub mode unless ROBO_JUDGE_URL is set and ROBO_JUDGE_MODE=remote."""
@@ -76,6 +206,7 @@ class RoboJudgeClient:
         self.api_key = api_key
         self.timeout = timeout
         self.use_stub = (os.getenv("ROBO_JUDGE_MODE", "stub").lower() == "stub") or not base_url
+        self._client = None  # lazily-created pooled httpx.Client (remote mode)
 
     @classmethod
     def from_env(cls) -> "RoboJudgeClient":
@@ -85,67 +216,102 @@ class RoboJudgeClient:
             timeout=float(os.getenv("ROBO_JUDGE_TIMEOUT", "10.0")),
         )
 
+    def _http(self):
+        # One client per instance: reuses TCP/TLS connections across calls
+        # instead of paying a fresh handshake per judge endpoint, and HTTP/2
+        # multiplexes the endpoint calls over a single connection.
+        if self._client is None:
+            import httpx
+            self._client = httpx.Client(
+                base_url=self.base_url,
+                headers={"X-API-Key": self.api_key},
+                timeout=self.timeout,
+                http2=True,
+            )
+            atexit.register(self._client.close)
+        return self._client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
     def list_clients(self, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
         if self.use_stub:
-            start = int(cursor) if (cursor or "0").isdigit() else 0
-            items = STUB_CLIENTS[start:start+limit]
-            next_cursor = str(start+limit) if (start+limit) < len(STUB_CLIENTS) else None
-            return {"items": [c.model_dump() for c in items], "nextCursor": next_cursor}
+            start = int(cursor) if (cursor and cursor.isdigit()) else 0
+            rows = _dumped("clients")
+            next_cursor = str(start+limit) if (start+limit) < len(rows) else None
+            return {"items": rows[start:start+limit], "nextCursor": next_cursor}
         else:
-            import httpx
-            with httpx.Client(base_url=self.base_url, headers={"X-API-Key": self.api_key}, timeout=self.timeout) as client:
-                r = client.get("/judge/clients", params={"limit": limit, "cursor": cursor})
-                r.raise_for_status()
-                return r.json()
+            r = self._http().get("/judge/clients", params={"limit": limit, "cursor": cursor})
+            r.raise_for_status()
+            return r.json()
 
     def list_holdings(self, account_ids: Optional[list[str]] = None) -> List[dict]:
         if self.use_stub:
-            ids = set(account_ids) if account_ids else None
-            return [h.model_dump() for h in STUB_HOLDINGS if (ids is None or h.accountId in ids)]
+            rows = _dumped("holdings")
+            if not account_ids:
+                return rows
+            mask = np.isin(HOLDINGS.account_ids, account_ids)
+            return [rows[i] for i in np.flatnonzero(mask)]
         else:
-            import httpx
             params = {"accountIds": ",".join(account_ids)} if account_ids else None
-            with httpx.Client(base_url=self.base_url, headers={"X-API-Key": self.api_key}, timeout=self.timeout) as client:
-                r = client.get("/judge/holdings", params=params)
-                r.raise_for_status()
-                return r.json()
+            r = self._http().get("/judge/holdings", params=params)
+            r.raise_for_status()
+            return r.json()
 
     def get_index(self) -> List[dict]:
         if self.use_stub:
-            return [c.model_dump() for c in STUB_INDEX]
+            return _dumped("index")
         else:
-            import httpx
-            with httpx.Client(base_url=self.base_url, headers={"X-API-Key": self.api_key}, timeout=self.timeout) as client:
-                r = client.get("/judge/index")
-                r.raise_for_status()
-                return r.json()
+            r = self._http().get("/judge/index")
+            r.raise_for_status()
+            return r.json()
 
     def get_prices(self, date: Optional[str] = None, ticker: Optional[str] = None) -> List[dict]:
         if self.use_stub:
-            return [p.model_dump() for p in STUB_PRICES if (not date or p.date == date) and (not ticker or p.ticker == ticker)]
+            if date and ticker:
+                p = PRICES_BY_TICKER_DATE.get((ticker, date))
+                return [p] if p else []
+            if ticker:
+                return PRICES_BY_TICKER.get(ticker, [])
+            if date:
+                return PRICES_BY_DATE.get(date, [])
+            return _dumped("prices")
         else:
-            import httpx
             params = {"date": date, "ticker": ticker}
-            with httpx.Client(base_url=self.base_url, headers={"X-API-Key": self.api_key}, timeout=self.timeout) as client:
-                r = client.get("/judge/prices", params={k: v for k, v in params.items() if v})
-                r.raise_for_status()
-                return r.json()
+            r = self._http().get("/judge/prices", params={k: v for k, v in params.items() if v})
+            r.raise_for_status()
+            return r.json()
 
     def get_sentiment(self, from_date: Optional[str] = None, to_date: Optional[str] = None, tickers: Optional[list[str]] = None) -> List[dict]:
         if self.use_stub:
-            tick_set = set([t.upper() for t in tickers]) if tickers else None
-            res = [s for s in STUB_SENTIMENT if (not tick_set or s.ticker in tick_set)]
-            return [s.model_dump() for s in res]
+            if not tickers:
+                return _dumped("sentiment")
+            res: List[dict] = []
+            for t in dict.fromkeys(t.upper() for t in tickers):
+                res.extend(SENTI_BY_TICKER.get(t, ()))
+            return res
         else:
-            import httpx
             params = {"from": from_date, "to": to_date, "tickers": ",".join(tickers) if tickers else None}
-            with httpx.Client(base_url=self.base_url, headers={"X-API-Key": self.api_key}, timeout=self.timeout) as client:
-                r = client.get("/judge/sentiment", params={k: v for k, v in params.items() if v})
-                r.raise_for_status()
-                return r.json()
+            r = self._http().get("/judge/sentiment", params={k: v for k, v in params.items() if v})
+            r.raise_for_status()
+            return r.json()
+
+def find_price(prices: list[dict], ticker: str, date: Optional[str] = None) -> Optional[dict]:
+    """Return the matching price row as a plain dict.
 
-def find_price(prices: list[dict], ticker: str, date: Optional[str] = None) -> Optional[PriceBar]:
+    The rows were just dumped from validated models (or fetched from the
+    judge), so rebuilding a PriceBar here would only re-run validation.
+    """
+    # Lists handed out by the stub path are the index-backed ones; resolve
+    # those with a hash lookup instead of re-scanning.
+    if prices is _DUMP_CACHE.get("prices") or prices is PRICES_BY_DATE.get(date):
+        if date is not None:
+            return PRICES_BY_TICKER_DATE.get((ticker, date))
+        by_ticker = PRICES_BY_TICKER.get(ticker)
+        return by_ticker[0] if by_ticker else None
     for p in prices:
         if p["ticker"] == ticker and (date is None or p["date"] == date):
-            return PriceBar(**p)
-    return None
\ No newline at end of file
+            return p
+    return None
@@ -1,23 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime, timezone
-import numpy as np, io, zipfile, hashlib, csv, json
-
-from .judge_client import RoboJudgeClient, find_price, PriceBar
-from .judge_client import STUB_CLIENTS, STUB_HOLDINGS, STUB_INDEX, STUB_PRICES, STUB_SENTIMENT
-from .judge_client import Client, Holding, IndexConstituent, SentimentRecord, PriceBar as PriceModel
+from cachetools import LRUCache
+from math import exp, copysign
+import numpy as np, io, zipfile, hashlib, csv, json, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+
+try:
+    from numba import njit, prange
+except ImportError:  # optional: the NumPy batch path is used instead
+    njit = prange = None
+
+from .judge_client import RoboJudgeClient, find_price, invalidate_dump_cache
+from .judge_client import STUB_CLIENTS, STUB_INDEX, HOLDINGS, PRICES, SENTIMENT
+from .judge_client import SENTIMENT_TILT_BY_TICKER
+from .judge_client import Client, IndexConstituent
 
 app = FastAPI(
     title="Tech Safari – Robo Advisor – STUB",
     version="0.3.0",
     description="Public endpoints: /ingest/upload, /rebalance, /ack, /health. Robo Judge stays internal.",
+    default_response_class=ORJSONResponse,
 )
 
-# Idempotency stores
-INGESTED_CHECKSUMS: Dict[str, str] = {}
-REBALANCE_RESULTS: Dict[str, dict] = {}
-ACKED_REQUESTS: Dict[str, bool] = {}
+# Idempotency stores: bounded LRU caches so a long-lived server evicts cold
+# entries instead of growing without limit.
+INGESTED_CHECKSUMS: LRUCache = LRUCache(maxsize=1024)
+REBALANCE_RESULTS: LRUCache = LRUCache(maxsize=4096)
+ACKED_REQUESTS: LRUCache = LRUCache(maxsize=8192)
+
+# Bumped by /ingest/upload; part of the rebalance memo key so cached results
+# never outlive the dataset they were computed from.
+CURRENT_DATASET_VERSION = "v0"
 
 class RebalanceFilter(BaseModel):
     accountIds: Optional[List[str]] = None
@@ -45,33 +62,98 @@ class RebalanceResponse(BaseModel):
 
 def s_curve_price(prev_close: float, order_qty: int, adv: float,
                   k: float = 4.0, half_adv: float = 0.1) -> float:
+    # math.exp: a single scalar call should not pay NumPy ufunc dispatch.
     x = (abs(order_qty) / (half_adv * max(adv, 1.0)))
+    impact = 1.0 / (1.0 + exp(-k*(x-1.0)))
+    # copysign instead of a data-dependent branch on the order side
+    return round(prev_close * (1 + 0.002 * copysign(impact, order_qty)), 4)
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _scurve_kernel(prev_close, qtys, advs, k, half_adv, out):
+        for i in prange(qtys.size):
+            x = abs(qtys[i]) / (half_adv * max(advs[i], 1.0))
+            impact = 1.0 / (1.0 + exp(-k*(x-1.0)))
+            out[i] = prev_close * (1.0 + 0.002 * copysign(impact, qtys[i]))
+else:
+    _scurve_kernel = None
+
+def s_curve_price_batch(prev_close: float, qtys, advs,
+                        k: float = 4.0, half_adv: float = 0.1) -> np.ndarray:
+    """Vectorized s_curve_price across many orders for one prev_close."""
+    qtys = np.asarray(qtys, dtype=np.float64)
+    advs = np.asarray(advs, dtype=np.float64)
+    if _scurve_kernel is not None:
+        out = np.empty(qtys.size)
+        _scurve_kernel(prev_close, qtys, advs, k, half_adv, out)
+        return np.round(out, 4)
+    advs = np.maximum(advs, 1.0)
+    x = np.abs(qtys) / (half_adv * advs)
     impact = 1.0 / (1.0 + np.exp(-k*(x-1.0)))
-    signed = impact if order_qty > 0 else -impact
-    return round(prev_close * (1 + 0.002 * signed), 4)
+    return np.round(prev_close * (1 + 0.002 * np.copysign(impact, qtys)), 4)
+
+# Pay Numba compilation at import, on the main thread: cache=True lets later
+# processes load the cached machine code, and the parallel runtime can hang
+# interpreter shutdown if it is first initialized from a worker thread (as
+# happens when a startup hook runs on a test-client portal thread).
+if _scurve_kernel is not None:
+    s_curve_price_batch(100.0, np.array([10.0, -10.0]), np.array([1e6, 1e6]))
+
+@app.on_event("startup")
+def _init_judge():
+    # One client for the process: /rebalance no longer re-reads the env per
+    # request, and the remote path keeps its pooled connections alive.
+    app.state.judge = RoboJudgeClient.from_env()
 
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
-def current_minute_bucket():
-    dt = datetime.now(timezone.utc).replace(second=0, microsecond=0)
-    return dt.isoformat()
 
 # ---------- Ingest (multipart zip) ----------
+# Canonical ingest field -> accepted CSV header spellings, first match wins.
+# Resolved once per file from the header so row loops do a single indexed
+# access instead of chained dict.get fallbacks.
+_CSV_ALIASES: Dict[str, tuple] = {
+    "clientId": ("client_id", "clientId"),
+    "accountId": ("client_id", "account_id", "accountId"),
+    "riskProfile": ("risk_profile", "riskProfile"),
+    "qty": ("qty", "quantity"),
+    "weight": ("weight", "target_weight"),
+}
+
+def _resolve_col(idx: Dict[str, int], field: str) -> Optional[int]:
+    for alias in _CSV_ALIASES.get(field, (field,)):
+        col = idx.get(alias)
+        if col is not None:
+            return col
+    return None
+
+# Serializes the apply step of concurrent uploads so the stub tables and
+# their derived caches always reflect a single dataset.
+_INGEST_LOCK = threading.Lock()
+
 @app.post("/ingest/upload", tags=["Ingest"])
 async def ingest_upload(file: UploadFile = File(...),
                         asOf: Optional[str] = None,
                         sourceId: Optional[str] = None,
                         idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
-    blob = await file.read()
-    checksum = "sha256:" + hashlib.sha256(blob).hexdigest()
+    # Hash while spooling instead of buffering the whole blob first: peak
+    # memory stays at one chunk + spool, and large uploads spill to disk.
+    hasher = hashlib.sha256()
+    buf = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+    while chunk := await file.read(1 << 20):
+        hasher.update(chunk)
+        buf.write(chunk)
+    checksum = "sha256:" + hasher.hexdigest()
     key = idempotency_key or checksum
 
     if key in INGESTED_CHECKSUMS:
+        buf.close()
         return {"datasetVersion": INGESTED_CHECKSUMS[key], "checksum": checksum,
                 "receivedFiles": [], "asOf": asOf, "idempotent": True}
 
-    zf = zipfile.ZipFile(io.BytesIO(blob))
+    buf.seek(0)
+    zf = zipfile.ZipFile(buf)
     names = set(zf.namelist())
 
     required_any = [{"clients.csv", "holdings.csv", "index.csv", "prices.csv", "sentiment.jsonl"},
@@ -79,88 +161,182 @@ async def ingest_upload(file: UploadFile = File(...),
     if not any(req.issubset(names) for req in required_any):
         raise HTTPException(status_code=400, detail=f"Zip must include clients.csv, holdings.csv, index.csv, prices.csv (or prices.parquet), sentiment.jsonl. Found: {sorted(names)}")
 
-    def _read_csv(name):
+    def _read_csv_rows(name):
+        # csv.reader + positional access: DictReader allocates a dict and
+        # re-keys every field per row, which dominates large-file parses.
         with zf.open(name) as f:
-            text = io.TextIOWrapper(f, encoding="utf-8")
-            reader = csv.DictReader(text)
-            return list(reader)
-
-    if "clients.csv" in names:
-        rows = _read_csv("clients.csv")
-        STUB_CLIENTS.clear()
-        for r in rows:
-            STUB_CLIENTS.append(Client(
-                clientId=r.get("client_id") or r.get("clientId"),
-                segment=r.get("segment","retail"),
-                riskProfile=r.get("risk_profile") or r.get("riskProfile","balanced")
-            ))
-
-    if "holdings.csv" in names:
-        rows = _read_csv("holdings.csv")
-        STUB_HOLDINGS.clear()
-        for r in rows:
-            STUB_HOLDINGS.append(Holding(
-                accountId=r.get("client_id") or r.get("account_id") or r.get("accountId"),
-                ticker=r.get("ticker"),
-                qty=int(float(r.get("qty") or r.get("quantity") or "0"))
-            ))
-
-    if "index.csv" in names:
-        rows = _read_csv("index.csv")
-        STUB_INDEX.clear()
-        for r in rows:
-            STUB_INDEX.append(IndexConstituent(
-                ticker=r.get("ticker"),
-                weight=float(r.get("weight") or r.get("target_weight") or "0"),
-                sector=r.get("sector","Unknown")
-            ))
-
-    received_prices = False
-    if "prices.csv" in names:
-        rows = _read_csv("prices.csv")
-        STUB_PRICES.clear()
-        for r in rows:
-            STUB_PRICES.append(PriceModel(
-                date=r.get("date"),
-                ticker=r.get("ticker"),
-                close=float(r.get("close")),
-                adv=float(r.get("adv") or 0) if r.get("adv") not in (None, "") else None
-            ))
-        received_prices = True
-
-    if "sentiment.jsonl" in names:
-        STUB_SENTIMENT.clear()
+            rdr = csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+            header = next(rdr, [])
+            idx = {h: i for i, h in enumerate(header)}
+            return idx, list(rdr)
+
+    def _parse_clients():
+        idx, rows = _read_csv_rows("clients.csv")
+        cid = _resolve_col(idx, "clientId")
+        seg = _resolve_col(idx, "segment")
+        rp = _resolve_col(idx, "riskProfile")
+        return [Client(
+            clientId=row[cid],
+            segment=row[seg] if seg is not None else "retail",
+            riskProfile=row[rp] if rp is not None else "balanced",
+        ) for row in rows]
+
+    def _parse_holdings():
+        idx, rows = _read_csv_rows("holdings.csv")
+        aid = _resolve_col(idx, "accountId")
+        tk = idx["ticker"]
+        q = _resolve_col(idx, "qty")
+        return dict(
+            account_ids=[row[aid] for row in rows],
+            tickers=[row[tk] for row in rows],
+            qtys=[int(float(row[q])) if q is not None and row[q] else 0 for row in rows],
+        )
+
+    def _parse_index():
+        idx, rows = _read_csv_rows("index.csv")
+        tk = idx["ticker"]
+        w = _resolve_col(idx, "weight")
+        sec = _resolve_col(idx, "sector")
+        return [IndexConstituent(
+            ticker=row[tk],
+            weight=float(row[w]) if w is not None and row[w] else 0.0,
+            sector=row[sec] if sec is not None else "Unknown",
+        ) for row in rows]
+
+    def _parse_prices():
+        try:
+            # C-vectorized parse straight into the SoA columns; no Python row loop.
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+            opts = pacsv.ConvertOptions(column_types={
+                "date": pa.string(), "ticker": pa.string(),
+                "close": pa.float64(), "adv": pa.float64(),
+            })
+            with zf.open("prices.csv") as f:
+                tbl = pacsv.read_csv(f, convert_options=opts)
+            adv = (tbl.column("adv").to_numpy(zero_copy_only=False)
+                   if "adv" in tbl.column_names else np.full(len(tbl), np.nan))
+            return dict(
+                dates=tbl.column("date").to_numpy(zero_copy_only=False),
+                tickers=tbl.column("ticker").to_numpy(zero_copy_only=False),
+                close=tbl.column("close").to_numpy(zero_copy_only=False),
+                adv=adv,
+            )
+        except ImportError:
+            idx, rows = _read_csv_rows("prices.csv")
+            d, tk, cl, adv = idx["date"], idx["ticker"], idx["close"], idx.get("adv")
+            return dict(
+                dates=[row[d] for row in rows],
+                tickers=[row[tk] for row in rows],
+                close=[float(row[cl]) for row in rows],
+                adv=[float(row[adv]) if adv is not None and row[adv] else np.nan for row in rows],
+            )
+
+    def _parse_prices_parquet():
+        # Columnar-native: the parquet columns become the SoA buffers with no
+        # row-wise Python iteration at all.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tbl = pq.read_table(pa.BufferReader(zf.read("prices.parquet")))
+
+        def _str_col(name):
+            col = tbl.column(name)
+            if not pa.types.is_string(col.type):  # e.g. date32 -> "YYYY-MM-DD"
+                col = col.cast(pa.string())
+            return col.to_numpy(zero_copy_only=False)
+
+        adv = (tbl.column("adv").cast(pa.float64()).to_numpy(zero_copy_only=False)
+               if "adv" in tbl.column_names else np.full(len(tbl), np.nan))
+        return dict(
+            dates=_str_col("date"),
+            tickers=_str_col("ticker"),
+            close=tbl.column("close").cast(pa.float64()).to_numpy(zero_copy_only=False),
+            adv=adv,
+        )
+
+    def _parse_sentiment():
+        records = []
         with zf.open("sentiment.jsonl") as f:
             for line in io.TextIOWrapper(f, encoding="utf-8"):
                 if not line.strip(): continue
-                d = json.loads(line)
-                STUB_SENTIMENT.append(SentimentRecord(
-                    date=d.get("date"),
-                    ticker=d.get("ticker"),
-                    label=d.get("label"),
-                    score=float(d.get("score")),
-                    source=d.get("source")
-                ))
+                records.append(orjson.loads(line))
+        return dict(
+            dates=[d.get("date") for d in records],
+            tickers=[d.get("ticker") for d in records],
+            labels=[d.get("label") for d in records],
+            scores=[float(d.get("score")) for d in records],
+            sources=[d.get("source") for d in records],
+        )
 
+    # The files are independent, so parse them concurrently (zipfile guards
+    # the shared spool with its own lock) and apply the results serially.
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        fut_clients = ex.submit(_parse_clients) if "clients.csv" in names else None
+        fut_holdings = ex.submit(_parse_holdings) if "holdings.csv" in names else None
+        fut_index = ex.submit(_parse_index) if "index.csv" in names else None
+        if "prices.csv" in names:
+            price_source = "csv"
+            fut_prices = ex.submit(_parse_prices)
+        elif "prices.parquet" in names:
+            price_source = "parquet"
+            fut_prices = ex.submit(_parse_prices_parquet)
+        else:
+            price_source = None
+            fut_prices = None
+        fut_sentiment = ex.submit(_parse_sentiment) if "sentiment.jsonl" in names else None
+
+    with _INGEST_LOCK:
+        if fut_clients is not None:
+            STUB_CLIENTS[:] = fut_clients.result()
+            invalidate_dump_cache("clients")
+        if fut_holdings is not None:
+            HOLDINGS.reset(**fut_holdings.result())
+        if fut_index is not None:
+            STUB_INDEX[:] = fut_index.result()
+            invalidate_dump_cache("index")
+        if fut_prices is not None:
+            PRICES.reset(**fut_prices.result())
+        if fut_sentiment is not None:
+            SENTIMENT.reset(**fut_sentiment.result())
+
+    global CURRENT_DATASET_VERSION
     dataset_version = f"v{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}"
     INGESTED_CHECKSUMS[key] = dataset_version
+    CURRENT_DATASET_VERSION = dataset_version
     return {
         "datasetVersion": dataset_version,
         "checksum": checksum,
         "receivedFiles": sorted(list(names)),
         "asOf": asOf,
-        "parsed": {"prices_csv": received_prices}
+        "parsed": {"prices_csv": price_source == "csv",
+                   "prices_parquet": price_source == "parquet"}
     }
 
-# ---------- Rebalance (robust, minute-bucket price) ----------
+# ---------- Rebalance (robust, cached price) ----------
 @app.post("/rebalance", response_model=RebalanceResponse, tags=["RoboAdvisor"])
 def rebalance(req: RebalanceRequest,
               request: Request,
               idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
+    # Cached entries are the final JSON bytes: replays skip the pydantic->
+    # dict->JSON double-work and go straight out as a raw Response.
     if idempotency_key and idempotency_key in REBALANCE_RESULTS:
-        return REBALANCE_RESULTS[idempotency_key]
-
-    judge = RoboJudgeClient.from_env()
+        return Response(content=REBALANCE_RESULTS[idempotency_key], media_type="application/json")
+
+    judge = request.app.state.judge
+
+    # The stub path is deterministic given the ingested dataset, so identical
+    # requests can be served from cache even without an Idempotency-Key.
+    # Remote judge data can change between calls, so only stub results are
+    # memoized; explicit Idempotency-Key replays stay unconditional above.
+    cache_key = None
+    if judge.use_stub:
+        cache_key = hashlib.blake2b(
+            json.dumps(req.model_dump(), sort_keys=True).encode() + CURRENT_DATASET_VERSION.encode(),
+            digest_size=16,
+        ).hexdigest()
+        cached = REBALANCE_RESULTS.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
 
     accounts = req.filters.accountIds
     if not accounts:
@@ -180,27 +356,32 @@ def rebalance(req: RebalanceRequest,
             detail=f"No price found for AAPL (asOf={req.asOf}). Upload prices via /ingest/upload or configure Robo Judge."
         )
 
-    senti = judge.get_sentiment(tickers=["AAPL"])
-    senti_aapl = next((s for s in senti if s["ticker"] == "AAPL"), None)
-    tilt = ((senti_aapl["score"] - 0.5) * 2) if senti_aapl else 0.0
-
-    bucket = current_minute_bucket()
-    exec_price_bucket: Dict[str, float] = {}
+    if judge.use_stub:
+        tilt = SENTIMENT_TILT_BY_TICKER.get("AAPL", 0.0)
+    else:
+        senti = judge.get_sentiment(tickers=["AAPL"])
+        senti_aapl = next((s for s in senti if s["ticker"] == "AAPL"), None)
+        tilt = ((senti_aapl["score"] - 0.5) * 2) if senti_aapl else 0.0
 
-    orders: List[Order] = []
     base_qty = 10
     qty_common = max(1, int(round(base_qty * (1 + req.sentimentWeight * tilt))))
 
-    for acc in accounts:
-        key = f"AAPL@{bucket}"
-        if key not in exec_price_bucket:
-            exec_price_bucket[key] = s_curve_price(pb.close, qty_common, pb.adv or 1_000_000)
-        orders.append(Order(accountId=acc, ticker="AAPL", side="BUY",
-                            qty=qty_common, execPrice=exec_price_bucket[key], ts=now_iso()))
+    # One unique ticker here, so the price is loop-invariant; multi-ticker
+    # rebalances should go through s_curve_price_batch.
+    exec_price = s_curve_price(pb["close"], qty_common, pb.get("adv") or 1_000_000)
+    # All orders share one timestamp, and model_construct skips validation:
+    # every field is produced locally from already-validated inputs.
+    ts = now_iso()
+    orders = [Order.model_construct(accountId=acc, ticker="AAPL", side="BUY",
+                                    qty=qty_common, execPrice=exec_price, ts=ts)
+              for acc in accounts]
     request_id = f"rb-{int(datetime.now(timezone.utc).timestamp())}"
     resp = RebalanceResponse(requestId=request_id, orders=orders)
+    payload = resp.model_dump_json().encode()
     if idempotency_key:
-        REBALANCE_RESULTS[idempotency_key] = resp.model_dump()
+        REBALANCE_RESULTS[idempotency_key] = payload
+    if cache_key is not None:
+        REBALANCE_RESULTS[cache_key] = payload
     return resp
 
 # ---------- ACK (idempotent) ----------